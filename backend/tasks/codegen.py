@@ -2218,7 +2218,8 @@ def integrate_figma_node(
     figma_json = _fetch_figma_node(file_key, node_id)
     t1 = time.time()
 
-    ir_full = FIR.figma_to_ir(figma_json, node_id)
+    # Osynliga delträd behövs bara när hela IR:en loggas/dumpas
+    ir_full = FIR.figma_to_ir(figma_json, node_id, skip_hidden=not (LOG_FIGMA_IR or LOG_IR_FULL))
     ir = FIR.filter_visible_ir(ir_full) if hasattr(FIR, "filter_visible_ir") else ir_full
 
     if LOG_FIGMA_IR:
@@ -40,6 +40,7 @@ Observera:
 """
 
 from __future__ import annotations
+from functools import lru_cache
 from typing import Any, Dict, List, Tuple
 import os
 import re
@@ -60,14 +61,7 @@ def _px(v: Any) -> str | None:
 
 def _dedup(seq: List[str]) -> List[str]:
     """Ta bort dubbletter med bibehållen ordning."""
-    seen: set[str] = set()
-    out: List[str] = []
-    for s in seq:
-        s = s.strip()
-        if s and s not in seen:
-            seen.add(s)
-            out.append(s)
-    return out
+    return list(dict.fromkeys(filter(None, (s.strip() for s in seq))))
 
 
 def _sanitize_tw(cls: str) -> str:
@@ -91,6 +85,19 @@ def _sanitize_tw(cls: str) -> str:
 # Text & typografi
 # ──────────────────────────────────────────────────────────────────────────────
 
+# Escapning av fontnamn (backslash, apostrof) i ett pass i stället för en replace-kedja
+_FAM_ESCAPES = str.maketrans({"\\": "\\\\", "'": "\\'"})
+
+
+@lru_cache(maxsize=256)
+def _font_family_class(fam: str) -> str:
+    """font-["…"]-klass för en fontfamilj; få unika familjer per design → cachad."""
+    return f'font-["{fam.strip().translate(_FAM_ESCAPES)}"]'
+
+
+_TEXT_ALIGN_TW = {"left": "text-left", "center": "text-center", "right": "text-right", "justify": "text-justify"}
+
+
 def _text_classes(st: Dict[str, Any]) -> List[str]:
     """Typografiklasser från text.style."""
     out: List[str] = []
@@ -124,12 +131,12 @@ def _text_classes(st: Dict[str, Any]) -> List[str]:
 
     fam = st.get("fontFamily")
     if isinstance(fam, str) and fam.strip():
-        fam_space = fam.strip().replace("\\", "\\\\").replace("'", "\\'")
-        out.append(f'font-["{fam_space}"]')
+        out.append(_font_family_class(fam))
 
     ta = st.get("textAlign")
-    if ta in ("left", "center", "right", "justify"):
-        out.append({"left": "text-left", "center": "text-center", "right": "text-right", "justify": "text-justify"}[ta])
+    ta_cls = _TEXT_ALIGN_TW.get(ta) if isinstance(ta, str) else None
+    if ta_cls:
+        out.append(ta_cls)
 
     col = st.get("color")
     if isinstance(col, str) and col.strip():
@@ -170,9 +177,7 @@ def _bg_classes(bg: Dict[str, Any] | None) -> List[str]:
         c = str(bg["color"])
         if a >= 0.999:
             return [f"bg-[{c}]"]
-        r = int(c[1:3], 16)
-        g = int(c[3:5], 16)
-        b = int(c[5:7], 16)
+        r, g, b = bytes.fromhex(c[1:7])
         return [f"bg-[rgba({r}, {g}, {b}, {a})]"]
     if t == "GRADIENT" and bg.get("css"):
         css = str(bg["css"])
@@ -17,12 +17,14 @@ Viktigt:
 - IGNORE_ROOT_FILL=1 i miljön tar bort rootens bg direkt i IR (och rensar bg-klasser på root).
 """
 
-from typing import Any, Dict, List, Optional, Tuple, cast
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
 import math
 import os
 import re
 import json
-from copy import deepcopy
+import sys
+from functools import lru_cache
+from itertools import chain
 
 # ────────────────────────────────────────────────────────────────────────────
 # Konfiguration
@@ -39,29 +41,55 @@ LAYOUT_STRIP_OPAQUE_BLACK = os.getenv("LAYOUT_STRIP_OPAQUE_BLACK", "1").lower()
 _MINLOG     = os.getenv("FIGMA_IR_MINLOG", "0").lower() in ("1","true","yes")
 TRACE_NODES = int(os.getenv("FIGMA_IR_TRACE_NODES", "0") or "0")
 
-def _minlog(evt: str, **kv):
-    if _MINLOG:
-        try:
-            print("[figma_ir]", evt, json.dumps(kv, ensure_ascii=False, default=str))
-        except Exception:
-            print("[figma_ir]", evt, kv)
+_MINLOG_BATCH = 256  # per-nod-loggar skrivs i block om så här många rader
+
+def _minlog_line(evt: str, kv: Dict[str, Any]) -> str:
+    try:
+        return f"[figma_ir] {evt} {json.dumps(kv, ensure_ascii=False, default=str)}\n"
+    except Exception:
+        return f"[figma_ir] {evt} {kv}\n"
+
+def _minlog_write(lines: List[str]) -> None:
+    # Ett write-anrop per block: med PYTHONUNBUFFERED (Docker) blir varje print annars flera syscalls
+    if lines:
+        sys.stdout.write("".join(lines))
+        lines.clear()
+
+def _minlog_enabled(evt: str, **kv):
+    sys.stdout.write(_minlog_line(evt, kv))
+
+def _minlog_noop(evt: str, **kv):
+    pass
+
+# Flaggan läses vid import, så valet görs en gång i stället för vid varje anrop.
+# Heta anropsställen gatas dessutom med `if _MINLOG:` så att kwargs aldrig byggs.
+_minlog = _minlog_enabled if _MINLOG else _minlog_noop
 
 # ────────────────────────────────────────────────────────────────────────────
 # Hjälpare: robusta getters och typer
 # ────────────────────────────────────────────────────────────────────────────
 
+# Delad tom sekvens för läs-only iteration (`x or _EMPTY`) – ingen ny lista per löv
+_EMPTY: Tuple[Any, ...] = ()
+
 def _get(d: Dict[str, Any], k: str, default=None):
     v = d.get(k, default)
     return v if v is not None else default
 
 def _to_float(x: Any) -> Optional[float]:
+    # Snabbväg: nästan alla värden i Figma-payloaden är redan float/int
+    c = x.__class__
+    if c is float: return x
+    if c is int: return float(x)
+    if x is None: return None
     try:
         return float(x)  # type: ignore[arg-type]
     except (TypeError, ValueError):
         return None
 
 def _is_num(x: Any) -> bool:
-    return _to_float(x) is not None
+    c = x.__class__
+    return c is float or c is int or _to_float(x) is not None
 
 def _round(x: Any, p: int = 3) -> Optional[float]:
     fx = _to_float(x)
@@ -74,29 +102,36 @@ def _px(x: Any) -> Optional[str]:
     fx = _to_float(x)
     if fx is None:
         return None
+    return _px_f(fx)
+
+@lru_cache(maxsize=8192)
+def _px_f(fx: float) -> str:
+    # Utdata beror bara på float-värdet; samma padding/gap/radie återkommer överallt
     return f"{int(round(fx))}px" if abs(fx - round(fx)) < 1e-6 else f"{round(fx, 2)}px"
 
-def _safe_name(s: Optional[str]) -> str:
-    return str(s or "")
+_BOOL_FALSE = frozenset({0, "0", "false", "False"})  # 0 matchar även 0.0 (samma hash/==)
+_BOOL_TRUE  = frozenset({1, "1", "true", "True"})
 
 def _bool(x: Any, default: bool = False) -> bool:
-    if isinstance(x, bool): return x
+    if x.__class__ is bool: return x
     if x is None: return default
-    if x in (0,"0","false","False"): return False
-    if x in (1,"1","true","True"):   return True
+    try:
+        if x in _BOOL_FALSE: return False
+        if x in _BOOL_TRUE:  return True
+    except TypeError:
+        pass  # ohashbara värden (list/dict) matchade aldrig tupeln heller
     return default
 
-_WS = re.compile(r"\s+")
+# str.split() delar på samma blanktecken som regexens \s (inkl. \u00A0, \u2007, \u202F),
+# så hårda mellanslag kollapsas utan separat replace-steg
 def _canon_text(s: str | None) -> str:
     if not isinstance(s, str): return ""
-    s = s.replace("\u00A0"," ").replace("\u2007"," ").replace("\u202F"," ")
-    return _WS.sub(" ", s).strip()
+    return " ".join(s.split())
 
 _LINE_SPLIT = re.compile(r"(?:\r?\n|[\u2022\u00B7•]+)\s*")
 def _canon_text_lines(s: str | None) -> List[str]:
     if not isinstance(s, str): return []
-    s = s.replace("\u00A0"," ").replace("\u2007"," ").replace("\u202F"," ")
-    parts = [_WS.sub(" ", p).strip() for p in _LINE_SPLIT.split(s)]
+    parts = [" ".join(p.split()) for p in _LINE_SPLIT.split(s)]
     return [p for p in parts if p]
 
 # ────────────────────────────────────────────────────────────────────────────
@@ -112,47 +147,87 @@ def _bounds(node: Dict[str, Any]) -> Dict[str, float]:
     y = _to_float(_get(bb, "y", node.get("y"))) or 0.0
     w = _to_float(_get(bb, "width",  node.get("width")))  or 0.0
     h = _to_float(_get(bb, "height", node.get("height"))) or 0.0
-    return {"x": cast(float, _round(x,3)), "y": cast(float, _round(y,3)),
-            "w": cast(float, _round(w,3)), "h": cast(float, _round(h,3))}
-
-def _rect_intersect(a: Optional[Dict[str, float]],
-                    b: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
-    if not a or not b: return a or b
-    x1 = max(a["x"], b["x"]); y1 = max(a["y"], b["y"])
-    x2 = min(a["x"] + a["w"], b["x"] + b["w"]); y2 = min(a["y"] + a["h"], b["y"] + b["h"])
+    # x/y/w/h är redan float här → round direkt; `or 0.0` normaliserar även -0.0
+    return {"x": round(x,3) or 0.0, "y": round(y,3) or 0.0,
+            "w": round(w,3) or 0.0, "h": round(h,3) or 0.0}
+
+# Klipprektanglar bärs genom traverseringen som (x, y, w, h)-tupler i stället för dicts
+Rect = Tuple[float, float, float, float]
+
+def _rect_of(b: Dict[str, float]) -> Rect:
+    return (b["x"], b["y"], b["w"], b["h"])
+
+def _rect_intersect(a: Optional[Rect], b: Optional[Rect]) -> Optional[Rect]:
+    if a is None or b is None: return a or b
+    ax, ay, aw, ah = a; bx, by, bw, bh = b
+    x1 = max(ax, bx); y1 = max(ay, by)
+    x2 = min(ax + aw, bx + bw); y2 = min(ay + ah, by + bh)
     if x2 <= x1 or y2 <= y1: return None
-    return {"x": _round(x1,3) or 0.0, "y": _round(y1,3) or 0.0,
-            "w": _round(x2-x1,3) or 0.0, "h": _round(y2-y1,3) or 0.0}
+    return (_round(x1,3) or 0.0, _round(y1,3) or 0.0,
+            _round(x2-x1,3) or 0.0, _round(y2-y1,3) or 0.0)
+
+# Billiga envelope-test utan avrundning/allokering (samma jämförelser som _rect_intersect)
+def _rects_overlap(a: Rect, b: Rect) -> bool:
+    ax, ay, aw, ah = a; bx, by, bw, bh = b
+    return not (min(ax + aw, bx + bw) <= max(ax, bx) or min(ay + ah, by + bh) <= max(ay, by))
+
+def _rect_contains(outer: Rect, inner: Rect) -> bool:
+    ox, oy, ow, oh = outer; ix, iy, iw, ih = inner
+    return (iw > 0 and ih > 0 and ox <= ix and oy <= iy and
+            ix + iw <= ox + ow and iy + ih <= oy + oh)
+
+def _next_clip(inherited_clip: Optional[Rect], b: Rect) -> Optional[Rect]:
+    # Nodens bounds täcker hela det ärvda klippet → klippet är oförändrat
+    # (det är redan avrundat till 3 decimaler, så intersektionen skulle ge samma tupel)
+    if inherited_clip is not None and _rect_contains(b, inherited_clip):
+        return inherited_clip
+    return _rect_intersect(inherited_clip, b)
 
 def _clips_content(n: Dict[str, Any]) -> bool:
     return _bool(n.get("clipsContent"), False) or _bool(n.get("clips_content"), False)
 
 def _effectively_visible(n: Dict[str, Any],
-                         inherited_clip: Optional[Dict[str, float]],
+                         inherited_clip: Optional[Rect],
                          inherited_visible: bool = True) -> bool:
     if not inherited_visible: return False
     if not _bool(n.get("visible"), True): return False
     op = _to_float(n.get("opacity"))
     if (op or 1.0) <= 0.01: return False
-    b = n.get("bounds") or {}
-    if inherited_clip is None: return True
-    return _rect_intersect(b, inherited_clip) is not None
+    b = n.get("bounds")
+    if inherited_clip is None or not b: return True
+    return _rects_overlap(_rect_of(b), inherited_clip)
 
 # ────────────────────────────────────────────────────────────────────────────
 # Färger och paints (lossless → både raw och effective)
 # ────────────────────────────────────────────────────────────────────────────
 
 def _clamp01(x: float) -> float: return 0.0 if x < 0 else 1.0 if x > 1 else x
+_HEX256 = tuple("%02x" % i for i in range(256))
+
 def _srgb_to_255(c01: float) -> int: return int(round(_clamp01(c01) * 255))
+@lru_cache(maxsize=4096)
+def _rgba_hex_parts(r01: float, g01: float, b01: float, a: float) -> Tuple[str, float]:
+    # Memoiserad kärna: designfiler återanvänder samma tokenfärger tusentals gånger
+    hex_ = "#" + _HEX256[_srgb_to_255(r01)] + _HEX256[_srgb_to_255(g01)] + _HEX256[_srgb_to_255(b01)]
+    return hex_, _round(a, 4) or 1.0
+
 def _rgba_hex(c: Optional[Dict[str, Any]]) -> Tuple[str, float]:
     c = c or {}
-    r01 = _to_float(_get(c, "r", 0.0)) or 0.0
-    g01 = _to_float(_get(c, "g", 0.0)) or 0.0
-    b01 = _to_float(_get(c, "b", 0.0)) or 0.0
-    r = _srgb_to_255(r01); g = _srgb_to_255(g01); b = _srgb_to_255(b01)
-    a = _to_float(_get(c, "a", 1.0)) or 1.0
-    hex_ = "#{:02x}{:02x}{:02x}".format(r, g, b)
-    return hex_, _round(a, 4) or 1.0
+    return _rgba_hex_parts(_to_float(c.get("r")) or 0.0,
+                           _to_float(c.get("g")) or 0.0,
+                           _to_float(c.get("b")) or 0.0,
+                           _to_float(c.get("a")) or 1.0)
+
+@lru_cache(maxsize=4096)
+def _hex_to_rgb(h: str) -> Tuple[int, int, int]:
+    r, g, b = bytes.fromhex(h[1:7])  # ett C-anrop i stället för tre int(..., 16)
+    return r, g, b
+
+@lru_cache(maxsize=8192, typed=True)
+def _rgba_css(h: str, a: float) -> str:
+    # Samma tokenfärg/alpha återkommer i gradienter, text, bg och skuggor
+    r, g, b = _hex_to_rgb(h)
+    return f"rgba({r}, {g}, {b}, {a})"
 
 def _has_rgb(d: Any) -> bool:
     return isinstance(d, dict) and all(_is_num(d.get(k)) for k in ("r","g","b"))
@@ -162,58 +237,74 @@ def _combine_alpha(a_color: float | None, a_paint: float | None) -> float:
     ap = a_paint if a_paint is not None else 1.0
     return _round(ac * ap, 4) or 0.0
 
+def _gradient_stop(st: Dict[str, Any], o: float) -> Dict[str, Any]:
+    hex_, a_col = _rgba_hex(st.get("color"))
+    pos = _to_float(st.get("position")) or 0.0
+    return {"position": _round(pos,4), "color": hex_, "alpha": _combine_alpha(a_col, o)}
+
+def _paint_solid(paint: Dict[str, Any], o: float, out: Dict[str, Any]) -> None:
+    color = paint.get("color")
+    if _has_rgb(color):
+        hex_, a_col = _rgba_hex(color)
+        a = _combine_alpha(a_col, o)
+        out.update({"color": hex_, "alpha": a})
+
+def _paint_gradient(paint: Dict[str, Any], o: float, out: Dict[str, Any]) -> None:
+    out["stops"] = [_gradient_stop(st, o) for st in
+                    paint.get("gradientStops") or _EMPTY]
+    # enkel vinkelapprox
+    h = paint.get("gradientHandlePositions") or []
+    if isinstance(h, list) and len(h) >= 2 and isinstance(h[0], dict) and isinstance(h[1], dict):
+        p0, p1 = h[0], h[1]
+        dx = (_to_float(p1.get("x")) or 0.0) - (_to_float(p0.get("x")) or 0.0)
+        dy = (_to_float(p1.get("y")) or 0.0) - (_to_float(p0.get("y")) or 0.0)
+        ang = math.degrees(math.atan2(dy, dx))
+        out["angle_deg"] = _round(ang,2)
+    else:
+        out["angle_deg"] = 0.0
+
+def _paint_image(paint: Dict[str, Any], o: float, out: Dict[str, Any]) -> None:
+    out["scaleMode"] = _get(paint, "scaleMode", "FILL")
+    out["imageRef"]  = paint.get("imageRef") or paint.get("imageHash")
+    out["filters"]   = paint.get("filters")
+    out["transform"] = paint.get("imageTransform")
+
+def _paint_raw(paint: Dict[str, Any], o: float, out: Dict[str, Any]) -> None:
+    out["raw"] = paint
+
+_GRADIENT_TYPES = frozenset({"GRADIENT_LINEAR","GRADIENT_RADIAL","GRADIENT_ANGULAR","GRADIENT_DIAMOND"})
+_PAINT_HANDLERS = {"SOLID": _paint_solid, "IMAGE": _paint_image,
+                   **{t: _paint_gradient for t in _GRADIENT_TYPES}}
+
 def _paint_to_fill(paint: Dict[str, Any]) -> Dict[str, Any]:
-    t = str(_get(paint, "type", "SOLID") or "SOLID")
-    visible = _bool(_get(paint, "visible", True), True)
-    o = _to_float(_get(paint, "opacity", 1.0)) or 1.0
+    t = str(paint.get("type") or "SOLID")
+    visible = _bool(paint.get("visible"), True)
+    o = _to_float(paint.get("opacity")) or 1.0
     out: Dict[str, Any] = {"type": t, "visible": visible, "alpha": _round(o,4)}
 
-    if t == "SOLID":
-        color = paint.get("color")
-        if _has_rgb(color):
-            hex_, a_col = _rgba_hex(cast(Dict[str, Any], color))
-            a = _combine_alpha(a_col, o)
-            out.update({"color": hex_, "alpha": a})
-    elif t.startswith("GRADIENT_"):
-        stops: List[Dict[str, Any]] = []
-        for st in cast(List[Dict[str, Any]], _get(paint, "gradientStops", []) or []):
-            col = cast(Optional[Dict[str, Any]], _get(st, "color", {}))
-            hex_, a_col = _rgba_hex(col)
-            pos = _to_float(_get(st, "position", 0.0)) or 0.0
-            a = _combine_alpha(a_col, o)
-            stops.append({"position": _round(pos,4), "color": hex_, "alpha": a})
-        out["stops"] = stops
-        # enkel vinkelapprox
-        h = cast(List[Dict[str, Any]], _get(paint, "gradientHandlePositions", []) or [])
-        if isinstance(h, list) and len(h) >= 2 and isinstance(h[0], dict) and isinstance(h[1], dict):
-            p0, p1 = h[0], h[1]
-            dx = (_to_float(_get(p1,"x",0.0)) or 0.0) - (_to_float(_get(p0,"x",0.0)) or 0.0)
-            dy = (_to_float(_get(p1,"y",0.0)) or 0.0) - (_to_float(_get(p0,"y",0.0)) or 0.0)
-            ang = math.degrees(math.atan2(dy, dx))
-            out["angle_deg"] = _round(ang,2)
-        else:
-            out["angle_deg"] = 0.0
-    elif t == "IMAGE":
-        out["scaleMode"] = _get(paint, "scaleMode", "FILL")
-        out["imageRef"]  = _get(paint, "imageRef") or _get(paint, "imageHash")
-        out["filters"]   = _get(paint, "filters")
-        out["transform"] = _get(paint, "imageTransform")
-    else:
-        out["raw"] = paint
+    handler = _PAINT_HANDLERS.get(t)
+    if handler is None:
+        # okända GRADIENT_*-varianter behandlas fortfarande som gradienter
+        handler = _paint_gradient if t.startswith("GRADIENT_") else _paint_raw
+    handler(paint, o, out)
     return out
 
 # Hjälpare för layout-wrappers och opaque svart
+_LAYOUT_WRAPPER_TYPES = frozenset({"FRAME", "COMPONENT", "INSTANCE", "GROUP"})
+_BG_CONTAINER_TYPES   = frozenset({"FRAME", "COMPONENT"})   # får bg från backgrounds/backgroundColor
+_NO_BG_WRAPPER_TYPES  = frozenset({"GROUP", "INSTANCE"})
+
 def _is_layout_wrapper(n: Dict[str, Any]) -> bool:
     t = str(_get(n, "type", ""))
-    has_kids = bool(_get(n, "children"))
+    has_kids = bool(n.get("children"))
     # GROUP kan sakna backgrounds, men inkluderas ofarligt
-    return t in ("FRAME", "COMPONENT", "INSTANCE", "GROUP") and has_kids and not _clips_content(n)
+    return t in _LAYOUT_WRAPPER_TYPES and has_kids and not _clips_content(n)
 
 def _is_opaque_black_paint(p: Dict[str, Any]) -> bool:
-    if str(_get(p, "type")) != "SOLID":
+    if str(p.get("type")) != "SOLID":
         return False
-    hex_, a_col = _rgba_hex(cast(Dict[str, Any], _get(p, "color", {})))
-    a = _combine_alpha(a_col, _to_float(_get(p, "opacity")) or 1.0)
+    hex_, a_col = _rgba_hex(p.get("color"))
+    a = _combine_alpha(a_col, _to_float(p.get("opacity")) or 1.0)
     return hex_ == "#000000" and (a or 0) >= 0.999
 
 def _effective_fills(doc_node: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -224,27 +315,28 @@ def _effective_fills(doc_node: Dict[str, Any]) -> List[Dict[str, Any]]:
       (FRAME/COMPONENT) som clippar. Detta undviker oavsiktliga wrapper-bakgrunder.
     - För layout-wrappers filtreras opaque svart (#000, α≈1) bort.
     """
-    # 1) Direkta fills vinner alltid
-    fills_list = [p for p in (_get(doc_node,"fills",[]) or []) if _bool(_get(p,"visible",True),True)]
+    # 1) Direkta fills vinner alltid (filtrering + konvertering i ett pass)
+    fills_list = [_paint_to_fill(p) for p in (doc_node.get("fills") or _EMPTY)
+                  if _bool(p.get("visible"), True)]
     if fills_list:
-        return [_paint_to_fill(p) for p in fills_list]
+        return fills_list
 
     # 2) Begränsad användning av backgrounds
-    bgs = _get(doc_node, "background") or _get(doc_node, "backgrounds")
+    bgs = doc_node.get("background") or doc_node.get("backgrounds")
     node_type = str(_get(doc_node, "type", ""))
     clips = _clips_content(doc_node)
 
-    if isinstance(bgs, list) and bgs and node_type in ("FRAME", "COMPONENT") and clips:
-        vis = [p for p in bgs if _bool(_get(p,"visible",True),True)]
-        if LAYOUT_STRIP_OPAQUE_BLACK and _is_layout_wrapper(doc_node):
-            vis = [p for p in vis if not _is_opaque_black_paint(p)]
+    if isinstance(bgs, list) and bgs and node_type in _BG_CONTAINER_TYPES and clips:
+        strip_black = LAYOUT_STRIP_OPAQUE_BLACK and _is_layout_wrapper(doc_node)
+        vis = [_paint_to_fill(p) for p in bgs
+               if _bool(p.get("visible"), True) and not (strip_black and _is_opaque_black_paint(p))]
         if vis:
-            return [_paint_to_fill(p) for p in vis]
+            return vis
 
     # 3) backgroundColor som sista utväg, samma begränsning
-    bgc = _get(doc_node, "backgroundColor")
-    if clips and node_type in ("FRAME", "COMPONENT") and _has_rgb(bgc):
-        hex_, a = _rgba_hex(cast(Dict[str, Any], bgc))
+    bgc = doc_node.get("backgroundColor")
+    if clips and node_type in _BG_CONTAINER_TYPES and _has_rgb(bgc):
+        hex_, a = _rgba_hex(bgc)
         if LAYOUT_STRIP_OPAQUE_BLACK and _is_layout_wrapper(doc_node) and hex_ == "#000000" and (a or 0) >= 0.999:
             return []
         return [{"type":"SOLID","visible":True,"alpha":a,"color":hex_}]
@@ -258,26 +350,24 @@ def _bg_from_effective_fills(fills: List[Dict[str, Any]]) -> Optional[Dict[str,
     - Första synliga SOLID med alpha > 0.001 → SOLID {color, alpha}
     - Första GRADIENT_* → GRADIENT {css, angle_deg}
     """
-    for f in fills or []:
-        if not _bool(f.get("visible", True), True):
-            continue
+    # _effective_fills släpper bara igenom synliga paints – ingen visible-koll här
+    for f in fills or _EMPTY:
         t = str(f.get("type") or "")
         if t == "SOLID" and f.get("color"):
             a = _to_float(f.get("alpha")) or 1.0
             if a > 0.001:
                 return {"type": "SOLID", "color": f["color"], "alpha": _round(a, 4)}
-        if t.startswith("GRADIENT_") and (f.get("stops") or []):
+        if t.startswith("GRADIENT_") and (f.get("stops") or _EMPTY):
             ang = _to_float(f.get("angle_deg")) or 0.0
             parts: List[str] = []
-            for s in f.get("stops", []):
+            for s in f.get("stops", _EMPTY):
                 c = str(s.get("color") or "#000000")
                 a = _to_float(s.get("alpha")) or 1.0
                 pos = int(round((_to_float(s.get("position")) or 0.0) * 100))
                 if a >= 0.999:
                     parts.append(f"{c} {pos}%")
                 else:
-                    r = int(c[1:3],16); g = int(c[3:5],16); b = int(c[5:7],16)
-                    parts.append(f"rgba({r}, {g}, {b}, {a}) {pos}%")
+                    parts.append(f"{_rgba_css(c, a)} {pos}%")
             css = f"linear-gradient({_round(ang,2)}deg,{','.join(parts)})"
             return {"type": "GRADIENT", "css": css, "angle_deg": _round(ang, 2)}
     return None
@@ -288,50 +378,55 @@ def _bg_from_effective_fills(fills: List[Dict[str, Any]]) -> Optional[Dict[str,
 
 def _stroke_to_ir(node: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str]:
     strokes: List[Dict[str, Any]] = []
-    for s in (_get(node,"strokes",[]) or []):
-        if not _bool(_get(s,"visible",True), True): continue
-        if _get(s,"type") == "SOLID":
-            color = _get(s, "color", {}) or {}
-            hex_, a = _rgba_hex(cast(Optional[Dict[str, Any]], color))
-            weight = _to_float(_get(node, "strokeWeight", 1.0)) or 1.0
+    for s in (node.get("strokes") or _EMPTY):
+        if not _bool(s.get("visible"), True): continue
+        if s.get("type") == "SOLID":
+            color = s.get("color") or {}
+            hex_, a = _rgba_hex(color)
+            weight = _to_float(node.get("strokeWeight")) or 1.0
             strokes.append({"type":"SOLID","color":hex_,"alpha":_round(a,4),"weight":_round(weight,3)})
         else:
-            strokes.append({"type":_get(s,"type"), "raw": s})
-    align = str(_get(node,"strokeAlign","CENTER") or "CENTER")
+            strokes.append({"type":s.get("type"), "raw": s})
+    align = str(node.get("strokeAlign") or "CENTER")
     return strokes, align
 
 def _radius_to_ir(node: Dict[str, Any]) -> Dict[str, float]:
-    cr = _get(node, "cornerRadius")
+    cr = node.get("cornerRadius")
     if _is_num(cr):
         r = _to_float(cr) or 0.0
         return {"tl": r, "tr": r, "br": r, "bl": r}
-    rcr = _get(node, "rectangleCornerRadii")
+    rcr = node.get("rectangleCornerRadii")
     if isinstance(rcr, list) and len(rcr) >= 4:
         return {"tl":_to_float(rcr[0]) or 0.0, "tr":_to_float(rcr[1]) or 0.0,
                 "br":_to_float(rcr[2]) or 0.0, "bl":_to_float(rcr[3]) or 0.0}
-    return {"tl": _to_float(_get(node,"topLeftRadius",0)) or 0.0,
-            "tr": _to_float(_get(node,"topRightRadius",0)) or 0.0,
-            "br": _to_float(_get(node,"bottomRightRadius",0)) or 0.0,
-            "bl": _to_float(_get(node,"bottomLeftRadius",0)) or 0.0}
+    return {"tl": _to_float(node.get("topLeftRadius")) or 0.0,
+            "tr": _to_float(node.get("topRightRadius")) or 0.0,
+            "br": _to_float(node.get("bottomRightRadius")) or 0.0,
+            "bl": _to_float(node.get("bottomLeftRadius")) or 0.0}
+
+# Effekttyper; isinstance-vakten behövs eftersom typen kommer rått från payloaden
+# och frozenset-uppslag (till skillnad från tuple-`in`) kräver hashbara värden
+_SHADOW_TYPES = frozenset({"DROP_SHADOW", "INNER_SHADOW"})
+_BLUR_TYPES   = frozenset({"LAYER_BLUR", "BACKGROUND_BLUR"})
 
 def _effects_to_ir(node: Dict[str, Any]) -> List[Dict[str, Any]]:
     out: List[Dict[str, Any]] = []
-    for ef in (_get(node,"effects",[]) or []):
-        if not _bool(_get(ef,"visible",True), True): continue
-        t = _get(ef, "type")
-        if t in ("DROP_SHADOW", "INNER_SHADOW"):
-            col = _get(ef, "color", {})
-            hex_, a = _rgba_hex(cast(Optional[Dict[str, Any]], col))
-            off: Dict[str, Any] = cast(Dict[str, Any], _get(ef,"offset",{}) or {})
+    for ef in (node.get("effects") or _EMPTY):
+        if not _bool(ef.get("visible"), True): continue
+        t = ef.get("type")
+        k = t if isinstance(t, str) else None
+        if k in _SHADOW_TYPES:
+            hex_, a = _rgba_hex(ef.get("color"))
+            off: Dict[str, Any] = ef.get("offset") or {}
             out.append({
                 "type": t,
                 "offset": {"x": _round(_get(off,"x",0.0),3), "y": _round(_get(off,"y",0.0),3)},
                 "radius": _round(_get(ef,"radius",0.0),3),
                 "spread": _round(_get(ef,"spread",0.0),3),
                 "color": hex_, "alpha": _round(a,4),
-                "blendMode": _get(ef, "blendMode")
+                "blendMode": ef.get("blendMode")
             })
-        elif t in ("LAYER_BLUR", "BACKGROUND_BLUR"):
+        elif k in _BLUR_TYPES:
             out.append({"type": t, "radius": _round(_get(ef,"radius",0.0),3)})
         else:
             out.append({"type": t, "raw": ef})
@@ -341,46 +436,60 @@ def _effects_to_ir(node: Dict[str, Any]) -> List[Dict[str, Any]]:
 # Layout och constraints
 # ────────────────────────────────────────────────────────────────────────────
 
+_PRIMARY_ALIGN = {"MIN":"flex-start","CENTER":"center","MAX":"flex-end","SPACE_BETWEEN":"space-between"}
+_COUNTER_ALIGN = {"MIN":"flex-start","CENTER":"center","MAX":"flex-end","BASELINE":"baseline","STRETCH":"stretch"}
+
 def _align_map_primary(v: str) -> str:
-    return {"MIN":"flex-start","CENTER":"center","MAX":"flex-end","SPACE_BETWEEN":"space-between"}.get(v or "MIN","flex-start")
+    return _PRIMARY_ALIGN.get(v or "MIN","flex-start")
 
 def _align_map_counter(v: str) -> str:
-    return {"MIN":"flex-start","CENTER":"center","MAX":"flex-end","BASELINE":"baseline","STRETCH":"stretch"}.get(v or "MIN","flex-start")
+    return _COUNTER_ALIGN.get(v or "MIN","flex-start")
 
 def _overflow_from_node(node: Dict[str, Any]) -> str:
-    return "hidden" if _bool(_get(node,"clipsContent"), False) else "visible"
+    return "hidden" if _bool(node.get("clipsContent"), False) else "visible"
 
 def _layout_to_ir(node: Dict[str, Any]) -> Dict[str, Any]:
     mode = _get(node,"layoutMode","NONE")
-    gap = _to_float(_get(node,"itemSpacing",0.0)) or 0.0
-    pad = {"t":_to_float(_get(node,"paddingTop",0.0)) or 0.0,
-           "r":_to_float(_get(node,"paddingRight",0.0)) or 0.0,
-           "b":_to_float(_get(node,"paddingBottom",0.0)) or 0.0,
-           "l":_to_float(_get(node,"paddingLeft",0.0)) or 0.0}
-    wrap = _get(node,"layoutWrap") == "WRAP"
-    primary = str(_get(node,"primaryAxisSizingMode","FIXED") or "FIXED")
-    counter = str(_get(node,"counterAxisSizingMode","FIXED") or "FIXED")
-    align_primary = _align_map_primary(str(_get(node,"primaryAxisAlignItems","MIN") or "MIN"))
-    align_counter = _align_map_counter(str(_get(node,"counterAxisAlignItems","MIN") or "MIN"))
+    gap = _to_float(node.get("itemSpacing")) or 0.0
+    pad = {"t":_to_float(node.get("paddingTop")) or 0.0,
+           "r":_to_float(node.get("paddingRight")) or 0.0,
+           "b":_to_float(node.get("paddingBottom")) or 0.0,
+           "l":_to_float(node.get("paddingLeft")) or 0.0}
+    wrap = node.get("layoutWrap") == "WRAP"
+    primary = str(node.get("primaryAxisSizingMode") or "FIXED")
+    counter = str(node.get("counterAxisSizingMode") or "FIXED")
+    align_primary = _align_map_primary(str(node.get("primaryAxisAlignItems") or "MIN"))
+    align_counter = _align_map_counter(str(node.get("counterAxisAlignItems") or "MIN"))
     return {"mode": mode, "gap": gap, "padding": pad, "wrap": wrap,
             "sizing":{"primary":primary,"counter":counter},
             "align_items": align_counter, "justify_content": align_primary}
 
 def _constraints(node: Dict[str, Any]) -> Dict[str, str]:
-    c = _get(node,"constraints",{}) or {}
-    return {"horizontal": str(_get(c,"horizontal","LEFT") or "LEFT"),
-            "vertical":   str(_get(c,"vertical","TOP") or "TOP")}
+    c = node.get("constraints") or {}
+    return {"horizontal": str(c.get("horizontal") or "LEFT"),
+            "vertical":   str(c.get("vertical") or "TOP")}
 
 def _is_absolute(node: Dict[str, Any]) -> bool:
-    return _get(node, "layoutPositioning") == "ABSOLUTE"
+    return node.get("layoutPositioning") == "ABSOLUTE"
 
 # ────────────────────────────────────────────────────────────────────────────
 # Text
 # ────────────────────────────────────────────────────────────────────────────
 
+@lru_cache(maxsize=512)
+def _weight_from_style(style_name: str) -> int:
+    # Ordningen är avsiktlig: "SemiBold" ska ge 700 (bold vinner), som tidigare
+    if   "bold"   in style_name: return 700
+    elif "semi"   in style_name: return 600
+    elif "medium" in style_name: return 500
+    return 400
+
+_TEXT_ALIGN_MAP = {"LEFT":"left","CENTER":"center","RIGHT":"right","JUSTIFIED":"justify"}
+_TEXT_CASE_MAP  = {"UPPER":"uppercase","LOWER":"lowercase","TITLE":"capitalize"}
+
 def _text_ir(node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    if _get(node,"type") != "TEXT": return None
-    raw_chars = _get(node,"characters","") or ""
+    if node.get("type") != "TEXT": return None
+    raw_chars = node.get("characters") or ""
     content = _canon_text(raw_chars)
     lines = _canon_text_lines(raw_chars)
 
@@ -399,7 +508,7 @@ def _text_ir(node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     else:
         ls = None
 
-    align = {"LEFT":"left","CENTER":"center","RIGHT":"right","JUSTIFIED":"justify"}.get(str(st.get("textAlignHorizontal") or ""), None)
+    align = _TEXT_ALIGN_MAP.get(str(st.get("textAlignHorizontal") or ""), None)
 
     deco = st.get("textDecoration")
     if   deco == "UNDERLINE":      text_decoration = "underline"
@@ -407,15 +516,11 @@ def _text_ir(node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     else:                          text_decoration = None
 
     tf = st.get("textCase")
-    text_transform = {"UPPER":"uppercase","LOWER":"lowercase","TITLE":"capitalize"}.get(str(tf), None)
+    text_transform = _TEXT_CASE_MAP.get(str(tf), None)
 
     weight = st.get("fontWeight")
     if weight is None:
-        style_name = (st.get("fontName") or {}).get("style","").lower()
-        if   "bold"   in style_name: weight = 700
-        elif "semi"   in style_name: weight = 600
-        elif "medium" in style_name: weight = 500
-        else: weight = 400
+        weight = _weight_from_style((st.get("fontName") or {}).get("style","").lower())
 
     # Textfärg: första synliga SOLID med sammanslagen alpha
     color_val: Optional[str] = None
@@ -423,14 +528,13 @@ def _text_ir(node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     if isinstance(fills_any, list):
         for p in fills_any:
             if isinstance(p, dict) and p.get("type")=="SOLID" and _bool(p.get("visible",True), True):
-                hex_, a_col = _rgba_hex(cast(Dict[str, Any], p.get("color", {})))
+                hex_, a_col = _rgba_hex(p.get("color", {}))
                 a_paint = _to_float(p.get("opacity")) or 1.0
                 a = _combine_alpha(a_col, a_paint)
                 if a >= 0.999:
                     color_val = hex_
                 else:
-                    r = int(hex_[1:3],16); g = int(hex_[3:5],16); b = int(hex_[5:7],16)
-                    color_val = f"rgba({r}, {g}, {b}, {a})"
+                    color_val = _rgba_css(hex_, a)
                 break
 
     return {
@@ -453,51 +557,76 @@ def _text_ir(node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 # Tailwind-syntes (deterministisk)
 # ────────────────────────────────────────────────────────────────────────────
 
-def _tw_required_for_node(n: Dict[str, Any]) -> List[str]:
-    tw: List[str] = []
-
-    # Geometri
-    b = n.get("bounds_rel") or n.get("bounds") or {}
-    if _is_num(b.get("w")): tw.append(f"w-[{_px(b.get('w'))}]")
-    if _is_num(b.get("h")): tw.append(f"h-[{_px(b.get('h'))}]")
-
-    if _bool(n.get("abs"), False):
-        tw.append("absolute")
-        if _is_num(b.get("x")): tw.append(f"left-[{_px(b.get('x'))}]")
-        if _is_num(b.get("y")): tw.append(f"top-[{_px(b.get('y'))}]")
+_TW_ITEMS_MAP   = {"flex-start":"items-start","center":"items-center",
+                   "flex-end":"items-end","stretch":"items-stretch","baseline":"items-baseline"}
+_TW_JUSTIFY_MAP = {"flex-start":"justify-start","center":"justify-center","flex-end":"justify-end","space-between":"justify-between"}
+
+def _tw_style_key(n: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Hashbar nyckel av exakt de fält som _tw_style_for_node läser."""
+    g = n.get  # körs för varje nod: bundna get-metoder i stället för attributslagning per fält
+    lay = g("layout") or {}
+    lg = lay.get
+    pad = lg("padding") or {}
+    pg = pad.get
+    if g("type") == "TEXT":
+        paint: Any = ("TEXT", ((g("text") or {}).get("style") or {}).get("color"))
     else:
-        tw.append("relative")
+        bg = g("bg")
+        paint = (bg.get("type"), bg.get("color"), bg.get("alpha"), bg.get("css")) if isinstance(bg, dict) else None
+    strokes = g("strokes") or []
+    s0 = (strokes[0].get("type"), strokes[0].get("color"), strokes[0].get("weight")) if strokes else None
+    rg = (g("radius") or {}).get
+    return (g("overflow"),
+            lg("mode"), lg("gap",0), pg("t"), pg("r"), pg("b"), pg("l"),
+            lg("align_items"), lg("justify_content"), lg("wrap"),
+            paint, s0, rg("tl",0), rg("tr",0), rg("br",0), rg("bl",0),
+            (g("css") or {}).get("boxShadow"), g("opacity"), g("rotation"))
+
+def _tw_style_for_node(n: Dict[str, Any], cache: Optional[Dict[Any, List[str]]] = None) -> List[str]:
+    if cache is None:
+        return _tw_style_classes(n)
+    try:
+        key: Any = _tw_style_key(n)
+        hit = cache.get(key)
+    except TypeError:  # ohashbara råvärden (t.ex. layoutMode) → ingen cache
+        key, hit = None, None
+    if hit is None:
+        hit = _tw_style_classes(n)
+        if key is not None:
+            cache[key] = hit
+    return hit
+
+def _tw_style_classes(n: Dict[str, Any]) -> List[str]:
+    tw: List[str] = []
+    append = tw.append
 
     # Overflow/clip
     if n.get("overflow") in ("hidden","clip"):
-        tw.append("overflow-hidden")
+        append("overflow-hidden")
 
     # Layout-hints (auto layout → flex)
-    lay = cast(Dict[str, Any], n.get("layout") or {})
+    lay = n.get("layout") or {}
     if lay.get("mode") in ("HORIZONTAL","VERTICAL"):
-        tw.append("flex")
-        tw.append("flex-row" if lay["mode"]=="HORIZONTAL" else "flex-col")
+        append("flex")
+        append("flex-row" if lay["mode"]=="HORIZONTAL" else "flex-col")
         gap = lay.get("gap",0)
-        if _is_num(gap) and (gap or 0) > 0: tw.append(f"gap-[{_px(gap)}]")
-        pad = cast(Dict[str, Any], lay.get("padding") or {})
+        if _is_num(gap) and (gap or 0) > 0: append(f"gap-[{_px(gap)}]")
+        pad = lay.get("padding") or {}
         for k,twk in (("t","pt"),("r","pr"),("b","pb"),("l","pl")):
             pv = _to_float(pad.get(k)) or 0.0
-            if pv: tw.append(f"{twk}-[{_px(pv)}]")
+            if pv: append(f"{twk}-[{_px(pv)}]")
         if lay.get("align_items"):
-            m = {"flex-start":"items-start","center":"items-center",
-                 "flex-end":"items-end","stretch":"items-stretch","baseline":"items-baseline"}
-            v = m.get(lay["align_items"]);  tw.append(v) if v else None
+            v = _TW_ITEMS_MAP.get(lay["align_items"]);  append(v) if v else None
         if lay.get("justify_content"):
-            m = {"flex-start":"justify-start","center":"justify-center","flex-end":"justify-end","space-between":"justify-between"}
-            v = m.get(lay["justify_content"]); tw.append(v) if v else None
-        if _bool(lay.get("wrap"), False): tw.append("flex-wrap")
+            v = _TW_JUSTIFY_MAP.get(lay["justify_content"]); append(v) if v else None
+        if _bool(lay.get("wrap"), False): append("flex-wrap")
 
     # Fills → text-färg för TEXT, annars bg från IR.bg
     if n.get("type") == "TEXT":
         st = (n.get("text") or {}).get("style") or {}
         col = st.get("color")
         if col:
-            tw.append(f"text-[{col}]")
+            append(f"text-[{col}]")
     else:
         bg = n.get("bg")
         if isinstance(bg, dict):
@@ -505,12 +634,11 @@ def _tw_required_for_node(n: Dict[str, Any]) -> List[str]:
             if t == "SOLID" and bg.get("color"):
                 a = _to_float(bg.get("alpha")) or 1.0
                 if a >= 0.999:
-                    tw.append(f"bg-[{bg['color']}]")
+                    append(f"bg-[{bg['color']}]")
                 else:
-                    c = bg["color"]; r=int(c[1:3],16); g=int(c[3:5],16); b_=int(c[5:7],16)
-                    tw.append(f"bg-[rgba({r}, {g}, {b_}, {a})]")
+                    append(f"bg-[{_rgba_css(bg['color'], a)}]")
             elif t == "GRADIENT" and (bg.get("css")):
-                tw.append(f"bg-[{bg['css']}]")
+                append(f"bg-[{bg['css']}]")
 
     # Border
     strokes = n.get("strokes") or []
@@ -518,54 +646,75 @@ def _tw_required_for_node(n: Dict[str, Any]) -> List[str]:
         s0 = strokes[0]
         if s0.get("type")=="SOLID" and s0.get("color"):
             w = s0.get("weight")
-            if _is_num(w): tw.append(f"border-[{_px(w)}]")
-            else:          tw.append("border")
-            tw.append(f"border-[{s0['color']}]")
+            if _is_num(w): append(f"border-[{_px(w)}]")
+            else:          append("border")
+            append(f"border-[{s0['color']}]")
 
     # Corner radius
     r = n.get("radius") or {}
     tl,tr,br,bl = r.get("tl",0), r.get("tr",0), r.get("br",0), r.get("bl",0)
-    if any([tl,tr,br,bl]):
+    if tl or tr or br or bl:
         if tl==tr==br==bl:
-            tw.append(f"rounded-[{_px(tl)}]")
+            append(f"rounded-[{_px(tl)}]")
         else:
-            if tl: tw.append(f"rounded-tl-[{_px(tl)}]")
-            if tr: tw.append(f"rounded-tr-[{_px(tr)}]")
-            if br: tw.append(f"rounded-br-[{_px(br)}]")
-            if bl: tw.append(f"rounded-bl-[{_px(bl)}]")
+            if tl: append(f"rounded-tl-[{_px(tl)}]")
+            if tr: append(f"rounded-tr-[{_px(tr)}]")
+            if br: append(f"rounded-br-[{_px(br)}]")
+            if bl: append(f"rounded-bl-[{_px(bl)}]")
 
     # Shadows
     css = n.get("css") or {}
     if css.get("boxShadow"):
-        tw.append(f"shadow-[{css['boxShadow']}]")
+        append(f"shadow-[{css['boxShadow']}]")
 
     # Opacity
-    if _is_num(n.get("opacity")) and (_to_float(n.get("opacity")) or 1.0) < 1:
-        tw.append(f"opacity-[{_to_float(n.get('opacity')) or 1.0}]")
+    op = n.get("opacity")
+    if _is_num(op) and (_to_float(op) or 1.0) < 1:
+        append(f"opacity-[{_to_float(op) or 1.0}]")
 
     # Rotation
     rot = n.get("rotation")
     if _is_num(rot) and abs((_to_float(rot) or 0.0)) > 0.001:
-        tw.append(f"rotate-[{_round((_to_float(rot) or 0.0),2)}deg]")
+        append(f"rotate-[{_round((_to_float(rot) or 0.0),2)}deg]")
+
+    return tw
+
+def _tw_required_for_node(n: Dict[str, Any], style_cache: Optional[Dict[Any, List[str]]] = None) -> List[str]:
+    tw: List[str] = []
+    append, is_num, px = tw.append, _is_num, _px
+
+    # Geometri
+    b = n.get("bounds_rel") or n.get("bounds") or {}
+    bw = b.get("w"); bh = b.get("h")
+    if is_num(bw): append(f"w-[{px(bw)}]")
+    if is_num(bh): append(f"h-[{px(bh)}]")
+
+    if _bool(n.get("abs"), False):
+        append("absolute")
+        bx = b.get("x"); by = b.get("y")
+        if is_num(bx): append(f"left-[{px(bx)}]")
+        if is_num(by): append(f"top-[{px(by)}]")
+    else:
+        append("relative")
+
+    # Stil (overflow, layout, färg, border, radius, skugga, opacity, rotation) – cachad
+    tw.extend(_tw_style_for_node(n, style_cache))
 
     # z-index
-    if _is_num(n.get("z")):
-        tw.append(f"z-[{int(_to_float(n.get('z')) or 0)}]")
+    z = n.get("z")
+    if is_num(z):
+        append(f"z-[{int(_to_float(z) or 0)}]")
 
-    # Normalisering
-    seen: set[str] = set()
-    out: List[str] = []
-    for t in tw:
-        if t and t not in seen:
-            seen.add(t); out.append(t)
+    # Normalisering: ordnad dedupe i C (dict bevarar insättningsordning); varje klass
+    # förekommer därefter högst en gång, så konfliktreglerna kan använda remove()
+    out = list(dict.fromkeys(filter(None, tw)))
 
     if "absolute" in out and "relative" in out:
-        out = [t for t in out if t != "relative"]
+        out.remove("relative")
 
     # border + border-[Xpx] → behåll explicit bredd
-    has_explicit_border_w = any(t.startswith("border-[") and t.endswith("px]") for t in out)
-    if has_explicit_border_w and "border" in out:
-        out = [t for t in out if t != "border"]
+    if "border" in out and any(t.startswith("border-[") and t.endswith("px]") for t in out):
+        out.remove("border")
 
     return out
 
@@ -573,52 +722,80 @@ def _tw_required_for_node(n: Dict[str, Any]) -> List[str]:
 # Ikon-hints
 # ────────────────────────────────────────────────────────────────────────────
 
-_ICON_TYPES = {"VECTOR","BOOLEAN_OPERATION","ELLIPSE","RECTANGLE","LINE","REGULAR_POLYGON","STAR"}
-_CONTAINERS = {"GROUP","INSTANCE","COMPONENT","COMPONENT_SET","FRAME"}
+_ICON_TYPES = frozenset({"VECTOR","BOOLEAN_OPERATION","ELLIPSE","RECTANGLE","LINE","REGULAR_POLYGON","STAR"})
+_CONTAINERS = frozenset({"GROUP","INSTANCE","COMPONENT","COMPONENT_SET","FRAME"})
 
+# Bytetabell: a–z/0–9 behålls, allt annat blir "-". Icke-ASCII kodas som "?" (en byte per
+# kodpunkt) och blir därmed också "-", precis som med regexen [^a-z0-9]+.
+_SLUG_TABLE = bytes(c if (0x30 <= c <= 0x39 or 0x61 <= c <= 0x7a) else 0x2d for c in range(256))
+_SLUG_COLLAPSE = re.compile(rb"-{2,}")
+
+@lru_cache(maxsize=4096)
 def _slug(s: str) -> str:
-    s = (s or "").lower()
-    s = re.sub(r"[^a-z0-9]+", "-", s).strip("-")
-    return s or "icon"
+    b = (s or "").lower().encode("ascii", "replace").translate(_SLUG_TABLE)
+    b = _SLUG_COLLAPSE.sub(b"-", b).strip(b"-")
+    return b.decode("ascii") or "icon"
 
 def _aspect_ok(w: float, h: float) -> bool:
     if w <= 0 or h <= 0: return False
     r = w / h
     return ICON_AR_MIN <= r <= ICON_AR_MAX
 
-def _has_text_desc(n: Dict[str, Any]) -> bool:
-    if (n.get("type") == "TEXT") and bool(n.get("visible_effective", True)): return True
-    for ch in n.get("children") or []:
-        if _has_text_desc(ch): return True
-    return False
+def _has_text_desc(n: Dict[str, Any], memo: Optional[Dict[int, bool]] = None) -> bool:
+    """
+    Finns en synlig TEXT-nod i delträdet (inkl. noden själv)?
+    Med memo (id(nod) → svar) räknas varje nod ut en gång per insamling, i stället för att
+    varje container-kandidat går om hela sitt delträd (O(n²) för nästlade containrar).
+    """
+    if memo is None:
+        stack = [n]
+        pop = stack.pop
+        while stack:
+            c = pop()
+            if (c.get("type") == "TEXT") and bool(c.get("visible_effective", True)): return True
+            stack.extend(c.get("children") or _EMPTY)  # any-sökning: ordningen spelar ingen roll
+        return False
+
+    hit = memo.get(id(n))
+    if hit is not None:
+        return hit
+    # Iterativ post-order; redan kända delträd hoppas över
+    frames: List[Tuple[Dict[str, Any], bool]] = [(n, False)]
+    while frames:
+        c, expanded = frames.pop()
+        k = id(c)
+        if k in memo:
+            continue
+        kids = c.get("children") or _EMPTY
+        if not expanded:
+            frames.append((c, True))
+            frames.extend((ch, False) for ch in kids if id(ch) not in memo)
+        else:
+            memo[k] = ((c.get("type") == "TEXT") and bool(c.get("visible_effective", True))) or \
+                      any(memo[id(ch)] for ch in kids)
+    return memo[id(n)]
 
 def _icon_hint(node: Dict[str, Any]) -> Dict[str, Any]:
     b = node.get("bounds") or {}
-    name = _safe_name(node.get("name"))
-    t = _safe_name(node.get("type"))
-    has_children = bool(node.get("children"))
+    name = str(node.get("name") or "")
+    t = str(node.get("type") or "")
     w, h = b.get("w") or 0.0, b.get("h") or 0.0
 
-    type_ok = t in _ICON_TYPES
-    size_typical = (ICON_MIN <= int(round(w)) <= ICON_MAX and
-                    ICON_MIN <= int(round(h)) <= ICON_MAX and
-                    _aspect_ok(w, h))
-    child_ok = not has_children
-
-    is_icon = bool(type_ok and child_ok and size_typical and w > 0 and h > 0)
-
-    # dominant färg (fill eller stroke)
-    hex_col = None; alpha = 1.0
-    fills = node.get("fills") or []
-    for p in fills:
-        if p.get("type")=="SOLID" and _bool(p.get("visible",True), True) and p.get("color"):
-            hex_col = p["color"]; alpha = float(p.get("alpha",1.0) or 1.0); break
-    if not hex_col:
-        for s in node.get("strokes") or []:
-            if s.get("type")=="SOLID" and _bool(s.get("visible",True), True) and s.get("color"):
-                hex_col = s["color"]; alpha = float(s.get("alpha",1.0) or 1.0); break
+    rw, rh = int(round(w)), int(round(h))  # före kortslutningen: NaN/inf ska fortfarande kasta
+
+    # Billiga tester först: containers/noder med barn når aldrig storlekskollen
+    is_icon = bool(t in _ICON_TYPES and not node.get("children") and w > 0 and h > 0 and
+                   ICON_MIN <= rw <= ICON_MAX and ICON_MIN <= rh <= ICON_MAX and
+                   _aspect_ok(w, h))
+
+    # dominant färg: första synliga SOLID med färg bland fills, annars strokes
+    dom = next((p for p in chain(node.get("fills") or _EMPTY, node.get("strokes") or _EMPTY)
+                if p.get("type")=="SOLID" and _bool(p.get("visible",True), True) and p.get("color")), None)
+    hex_col = dom["color"] if dom else None
+    alpha = float(dom.get("alpha",1.0) or 1.0) if dom else 1.0
 
     tintable = bool(is_icon and hex_col)
+    rot = node.get("rotation")
 
     return {
         "is_icon": is_icon,
@@ -629,27 +806,47 @@ def _icon_hint(node: Dict[str, Any]) -> Dict[str, Any]:
         "dominant_color": hex_col,
         "dominant_alpha": alpha,
         "tintable": tintable,
-        "rotation": _round(_get(node,"rotation",0.0),3),
+        "rotation": 0.0 if rot is None else _round(rot, 3),
     }
 
 # ────────────────────────────────────────────────────────────────────────────
 # CSS sammanställning (för skugga mm., används till TW)
 # ────────────────────────────────────────────────────────────────────────────
 
-def _css_from_node(n: Dict[str, Any]) -> Dict[str, Any]:
+def _is_shadow(ef: Dict[str, Any]) -> bool:
+    t = ef.get("type")
+    return isinstance(t, str) and t in _SHADOW_TYPES
+
+def _css_from_node(n: Dict[str, Any], cache: Optional[Dict[Any, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    if cache is None:
+        return _css_from_effects(n)
+    try:
+        key: Any = tuple((ef["type"], (ef.get("offset") or {}).get("x"), (ef.get("offset") or {}).get("y"),
+                          ef.get("radius"), ef.get("spread"), ef.get("color"), ef.get("alpha"))
+                         for ef in (n.get("effects") or _EMPTY) if _is_shadow(ef))
+        hit = cache.get(key)
+    except TypeError:
+        key, hit = None, None
+    if hit is None:
+        hit = _css_from_effects(n)
+        if key is not None:
+            cache[key] = hit
+    return dict(hit)
+
+def _css_from_effects(n: Dict[str, Any]) -> Dict[str, Any]:
     css: Dict[str, Any] = {}
 
     # Box-shadow från effects
     shadows: List[str] = []
-    for ef in (n.get("effects") or []):
-        if ef.get("type") in ("DROP_SHADOW","INNER_SHADOW"):
+    for ef in (n.get("effects") or _EMPTY):
+        if _is_shadow(ef):
             off = ef.get("offset") or {}
             dx, dy = _px(off.get("x")), _px(off.get("y"))
             blur = _px(ef.get("radius"))
             spread = _px(ef.get("spread") or 0)
             col = str(ef.get("color") or "#000000")
             a = _to_float(ef.get("alpha")) or 1.0
-            rgba = f"rgba({int(col[1:3],16)}, {int(col[3:5],16)}, {int(col[5:7],16)}, {a})"
+            rgba = _rgba_css(col, a)
             inset = " inset" if ef["type"]=="INNER_SHADOW" else ""
             shadows.append(f"{dx} {dy} {blur} {spread} {rgba}{inset}")
     if shadows:
@@ -663,29 +860,101 @@ def _css_from_node(n: Dict[str, Any]) -> Dict[str, Any]:
 
 def _node_to_ir(doc_node: Dict[str, Any], *,
                 root_origin: Tuple[float,float],
-                inherited_clip: Optional[Dict[str, float]],
+                inherited_clip: Optional[Rect],
                 inherited_visible: bool,
                 _z: int,
-                _is_root: bool) -> Dict[str, Any]:
+                _is_root: bool,
+                _skip_hidden: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Bygger IR för hela delträdet iterativt (explicit stack, ingen rekursion per nivå),
+    så djupa Figma-träd inte slår i rekursionsgränsen.
+    """
+    root_ir: Optional[Dict[str, Any]] = None
+    # (nod, förälderns children-lista, klipp, ärvd synlighet, z, is_root, skip_hidden)
+    # eller (None, post-loggar) som markör för efter-barn-loggning
+    stack: List[Tuple[Any, ...]] = [(doc_node, None, inherited_clip, inherited_visible, _z, _is_root, _skip_hidden)]
+    pop, push = stack.pop, stack.append
+    build, empty = _node_ir_shallow, _EMPTY  # lokala bindningar i den heta loopen
+    log_buf: List[str] = []  # efter-barn-loggar (bara ifyllt när _MINLOG är på)
+    # Stilcacher för CSS/TW som lever exakt ett bygge (lokala → delas inte mellan samtidiga
+    # byggen och släpps när bygget är klart). Designsystem återanvänder samma stil hundratals gånger.
+    css_cache: Dict[Any, Dict[str, Any]] = {}
+    tw_cache: Dict[Any, List[str]] = {}
+    # finally: redan avslutade delträds loggar skrivs även om en senare nod kastar
+    try:
+        while stack:
+            frame = pop()
+            node = frame[0]
+            if node is None:
+                log_buf.extend(_minlog_line(evt, kv) for evt, kv in frame[1])
+                if len(log_buf) >= _MINLOG_BATCH:
+                    _minlog_write(log_buf)
+                continue
+            _, parent_kids, clip, vis, z, is_root, skip = frame
+            built = build(node, root_origin=root_origin, inherited_clip=clip,
+                                     inherited_visible=vis, _z=z, _is_root=is_root, _skip_hidden=skip,
+                                     _css_cache=css_cache, _tw_cache=tw_cache)
+            if built is None:
+                continue  # hela delträdet skulle ändå rensas av filter_visible_ir
+            ir, next_clip, eff_visible, post_logs = built
+            if parent_kids is None:
+                root_ir = ir
+            else:
+                parent_kids.append(ir)
+            if post_logs:
+                push((None, post_logs))  # loggas efter barnen, som i den rekursiva ordningen
+
+            # Barn i z-ordning (originalordning); pushas baklänges så att de poppas i ordning.
+            # Osynlig root → inget hoppas över, eftersom filter_visible_ir då faller tillbaka på hela trädet.
+            kids_src = node.get("children") or empty
+            if kids_src:
+                kids = ir["children"]
+                skip_kids = skip and eff_visible
+                for i in range(len(kids_src) - 1, -1, -1):
+                    push((kids_src[i], kids, next_clip, eff_visible, i, False, skip_kids))
+    finally:
+        _minlog_write(log_buf)
+    return root_ir
+
+def _node_ir_shallow(doc_node: Dict[str, Any], *,
+                     root_origin: Tuple[float,float],
+                     inherited_clip: Optional[Rect],
+                     inherited_visible: bool,
+                     _z: int,
+                     _is_root: bool,
+                     _skip_hidden: bool,
+                     _css_cache: Optional[Dict[Any, Dict[str, Any]]] = None,
+                     _tw_cache: Optional[Dict[Any, List[str]]] = None
+                     ) -> Optional[Tuple[Dict[str, Any], Optional[Rect], bool, List[Tuple[str, Dict[str, Any]]]]]:
+    """En nods IR utan barn (children fylls av _node_to_ir) + klipp/synlighet för barnen."""
+    g = doc_node.get  # bunden metod: en attributslagning per nod i stället för per fält
     bounds_abs = _bounds(doc_node)
     rx, ry = root_origin
     bounds_rel = {
-        "x": cast(float, _round(bounds_abs["x"] - rx, 3)),
-        "y": cast(float, _round(bounds_abs["y"] - ry, 3)),
+        "x": _round(bounds_abs["x"] - rx, 3) or 0.0,
+        "y": _round(bounds_abs["y"] - ry, 3) or 0.0,
         "w": bounds_abs["w"], "h": bounds_abs["h"]
     }
 
-    own_visible = _bool(doc_node.get("visible"), True)
-    opacity = _round(_get(doc_node,"opacity",1.0),4) or 1.0
+    # Inline snabbvägar för de vanliga fallen (bool/None); övrigt via _bool/_round
+    vis_raw = g("visible")
+    own_visible = vis_raw if vis_raw.__class__ is bool else (True if vis_raw is None else _bool(vis_raw, True))
+    op_raw = g("opacity")
+    opacity = 1.0 if op_raw is None else (_round(op_raw,4) or 1.0)
     clips_here = _clips_content(doc_node)
-    next_clip = _rect_intersect(inherited_clip, bounds_abs) if clips_here else inherited_clip
+    next_clip = _next_clip(inherited_clip, _rect_of(bounds_abs)) if clips_here else inherited_clip
 
     prelim = {"visible": own_visible, "opacity": opacity, "bounds": bounds_abs}
     eff_visible = _effectively_visible(prelim, inherited_clip, inherited_visible)
+    if _skip_hidden and not eff_visible and not _is_root:
+        return None  # hela delträdet skulle ändå rensas av filter_visible_ir
 
     fills_eff = _effective_fills(doc_node)
     bg_eff = _bg_from_effective_fills(fills_eff)
-    if str(_get(doc_node, "type", "")) == "TEXT":
+    # Internerad: tusentals noder delar samma "FRAME"/"TEXT"-objekt, och mängd-/==-test
+    # mot modulens (redan internerade) literaler träffar på identitet
+    node_type = sys.intern(str(g("type") or ""))
+    if node_type == "TEXT":
         bg_eff = None
         
     strokes, stroke_align = _stroke_to_ir(doc_node)
@@ -696,12 +965,13 @@ def _node_to_ir(doc_node: Dict[str, Any], *,
     l = _layout_to_ir(doc_node)
     cons = _constraints(doc_node)
     ov = _overflow_from_node(doc_node)
-    rot = _round(_get(doc_node,"rotation",0.0),3)
+    rot_raw = g("rotation")
+    rot = 0.0 if rot_raw is None else _round(rot_raw, 3)
 
     ir: Dict[str, Any] = {
-        "id": _safe_name(doc_node.get("id")),
-        "name": _safe_name(doc_node.get("name")),
-        "type": _safe_name(doc_node.get("type")),
+        "id": str(g("id") or ""),
+        "name": str(g("name") or ""),
+        "type": node_type,
         "visible": own_visible,
         "visible_effective": bool(eff_visible),
         "abs": abspos,
@@ -716,7 +986,7 @@ def _node_to_ir(doc_node: Dict[str, Any], *,
         "radius": radius,
         "effects": effects,
         "opacity": opacity,
-        "blend_mode": doc_node.get("blendMode"),
+        "blend_mode": g("blendMode"),
         "clips_content": clips_here,
         "overflow": ov,
         "text": text,
@@ -726,33 +996,28 @@ def _node_to_ir(doc_node: Dict[str, Any], *,
         "is_root": _is_root,
         "paints_raw": {
             "fills": _get(doc_node,"fills",[]),
-            "background": _get(doc_node,"background"),
-            "backgrounds": _get(doc_node,"backgrounds"),
-            "backgroundColor": _get(doc_node,"backgroundColor"),
+            "background": g("background"),
+            "backgrounds": g("backgrounds"),
+            "backgroundColor": g("backgroundColor"),
         },
     }
 
-    # CSS & TW
-    ir["css"] = _css_from_node(ir)
-    tw_classes = _tw_required_for_node(ir)
+    # CSS & TW (härleds ur IR-fälten ovan)
+    ir["css"] = _css_from_node(ir, _css_cache)
+    tw_classes = _tw_required_for_node(ir, _tw_cache)
     ir["tw"]  = {"classes": " ".join(tw_classes), "list": tw_classes}
 
-    # Ikon-hint
+    # Ikon-hint (ir["bounds"] är redan bounds_abs – ingen kopia av hela noden behövs)
     try:
-        ih = _icon_hint({"bounds": bounds_abs, **ir})
-        ir["icon"] = ih
+        ir["icon"] = _icon_hint(ir)
     except Exception:
         ir["icon"] = {"is_icon": False}
 
-    # Barn i z-ordning (originalordning)
-    for i, ch in enumerate(doc_node.get("children") or []):
-        ir["children"].append(
-            _node_to_ir(ch, root_origin=root_origin, inherited_clip=next_clip,
-                        inherited_visible=eff_visible, _z=i, _is_root=False)
-        )
+    # Efter-barn-loggar samlas här och skrivs ut av _node_to_ir när delträdet är klart
+    post_logs: List[Tuple[str, Dict[str, Any]]] = []
 
-    # Mini-logg för root BG
-    if _is_root:
+    # Mini-logg för root BG (byggs bara när loggning är på)
+    if _is_root and _MINLOG:
         bg_desc = "none"
         if isinstance(bg_eff, dict):
             t = str(bg_eff.get("type") or "")
@@ -761,20 +1026,18 @@ def _node_to_ir(doc_node: Dict[str, Any], *,
             elif t == "GRADIENT":
                 bg_desc = "gradient"
         else:
-            for f in (fills_eff or []):
-                if not _bool(f.get("visible",True), True): continue
+            for f in (fills_eff or _EMPTY):
                 t = str(f.get("type") or "")
                 if t == "SOLID" and f.get("color") and (_to_float(f.get("alpha")) or 1.0) > 0.001:
                     bg_desc = f.get("color"); break
-                if t.startswith("GRADIENT_") and (f.get("stops") or []):
+                if t.startswith("GRADIENT_") and (f.get("stops") or _EMPTY):
                     bg_desc = "gradient"; break
-        _minlog("bg.root.summary", resolved=bg_desc)
+        post_logs.append(("bg.root.summary", {"resolved": bg_desc}))
 
     # Per-nod trace
-    if TRACE_NODES:
+    if TRACE_NODES and _MINLOG:
         try:
-            _minlog(
-                "ir.node",
+            post_logs.append(("ir.node", dict(
                 id=ir["id"],
                 type=ir["type"],
                 bounds_abs=bounds_abs,
@@ -786,15 +1049,27 @@ def _node_to_ir(doc_node: Dict[str, Any], *,
                 effects=len(effects),
                 layout=ir["layout"],
                 abs=ir["abs"]
-            )
+            )))
         except Exception:
             pass
 
     # Sista skydd – inga oavsiktliga bg på wrappers som inte clippar och saknar fills
-    if not clips_here and not fills_eff and ir.get("bg") and ir["type"] in ("GROUP", "INSTANCE"):
+    if not clips_here and not fills_eff and ir.get("bg") and ir["type"] in _NO_BG_WRAPPER_TYPES:
         ir["bg"] = None
 
-    return ir
+    return ir, next_clip, eff_visible, post_logs
+
+def _reindex_order(root: Dict[str, Any]) -> None:
+    """Sätt z/order/order_key på alla barn (iterativt; ordningen mellan noder spelar ingen roll)."""
+    stack = [root]
+    pop, push = stack.pop, stack.append
+    while stack:
+        n = pop()
+        for i, ch in enumerate(n.get("children") or _EMPTY):
+            b = ch.get("bounds",{})
+            ch["z"] = ch["order"] = i
+            ch["order_key"] = (int(round(b.get("y") or 0)), int(round(b.get("x") or 0)), i)  # serialiseras som lista
+            push(ch)
 
 def _rebuild_tw_for_node(n: Dict[str, Any]) -> None:
     """Rekalkylera TW för en nod utifrån dess aktuella IR-fält."""
@@ -805,8 +1080,13 @@ def _rebuild_tw_for_node(n: Dict[str, Any]) -> None:
 # Publikt API
 # ────────────────────────────────────────────────────────────────────────────
 
-def figma_to_ir(figma_json: Dict[str, Any], node_id: str) -> Dict[str, Any]:
-    """Lossless IR: viewport = root-bounds, koordinater är root-relativa, ingen destruktiv pruning."""
+def figma_to_ir(figma_json: Dict[str, Any], node_id: str, *, skip_hidden: bool = False) -> Dict[str, Any]:
+    """
+    Lossless IR: viewport = root-bounds, koordinater är root-relativa, ingen destruktiv pruning.
+
+    skip_hidden=True hoppar över effektivt osynliga delträd redan vid bygget (ingen CSS/TW/ikon
+    för dem). Resultatet är då inte längre lossless, men filter_visible_ir ger identisk utdata.
+    """
     # Hämta document för node_id
     nodes = (figma_json.get("nodes") or {})
     doc: Optional[Dict[str, Any]] = None
@@ -824,12 +1104,13 @@ def figma_to_ir(figma_json: Dict[str, Any], node_id: str) -> Dict[str, Any]:
     # Startlogg
     _minlog("ir.build.start", node_id=node_id, root_bounds=root_bounds)
 
-    clip = dict(root_bounds)  # viewport = root-bounds
-    _minlog("clip.config", strict=False, clip=clip)
+    clip = _rect_of(root_bounds)  # viewport = root-bounds
+    _minlog("clip.config", strict=False, clip=root_bounds)
 
     root_origin = (root_bounds["x"], root_bounds["y"])
-    root_ir = _node_to_ir(doc, root_origin=root_origin, inherited_clip=clip,
-                          inherited_visible=True, _z=0, _is_root=True)
+    root_ir = cast(Dict[str, Any], _node_to_ir(doc, root_origin=root_origin, inherited_clip=clip,
+                                               inherited_visible=True, _z=0, _is_root=True,
+                                               _skip_hidden=skip_hidden))
 
     # Ignorera rootens bg om flagga är satt: rensa IR och TW på root
     if os.getenv("IGNORE_ROOT_FILL") == "1":
@@ -840,15 +1121,7 @@ def figma_to_ir(figma_json: Dict[str, Any], node_id: str) -> Dict[str, Any]:
         _minlog("bg.root.ignored", flag="IGNORE_ROOT_FILL=1")
 
     # Stabil z/order metadata
-    def _reindex(n: Dict[str, Any]):
-        for i, ch in enumerate(n.get("children") or []):
-            ch["z"] = i
-            by = int(round((ch.get("bounds",{}).get("y") or 0)))
-            bx = int(round((ch.get("bounds",{}).get("x") or 0)))
-            ch["order"] = i
-            ch["order_key"] = [by, bx, i]
-            _reindex(ch)
-    _reindex(root_ir)
+    _reindex_order(root_ir)
 
     meta = {
         "nodeId": node_id,
@@ -860,10 +1133,11 @@ def figma_to_ir(figma_json: Dict[str, Any], node_id: str) -> Dict[str, Any]:
     out = {"meta": meta, "root": root_ir}
 
     # Slutlogg
-    try:
-        _minlog("ir.build.done", meta=meta, totals={"nodes": len(json.dumps(root_ir))})
-    except Exception:
-        pass
+    if _MINLOG:
+        try:
+            _minlog("ir.build.done", meta=meta, totals={"nodes": len(json.dumps(root_ir))})
+        except Exception:
+            pass
 
     return out
 
@@ -881,35 +1155,41 @@ def filter_visible_ir(ir_full: Dict[str, Any]) -> Dict[str, Any]:
             return True
         return False
 
-    def prune(n: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        kids: List[Dict[str, Any]] = []
-        for ch in n.get("children") or []:
-            p = prune(ch)
-            if p is not None:
-                kids.append(p)
-
-        eff = bool(n.get("visible_effective", True))
-        keep = eff or len(kids) > 0 or contributes(n)
-        if not keep:
-            return None
-
-        nn = deepcopy(n)
-        nn["children"] = kids
-        return nn
+    def prune(root: Dict[str, Any], keep_all: bool = False) -> Optional[Dict[str, Any]]:
+        # Iterativ post-order: [nod, barnkälla, nästa barnindex, behållna barn]
+        frames: List[List[Any]] = [[root, root.get("children") or _EMPTY, 0, []]]
+        result: Optional[Dict[str, Any]] = None
+        while frames:
+            f = frames[-1]
+            src = f[1]; i = f[2]
+            if i < len(src):
+                f[2] = i + 1
+                ch = src[i]
+                frames.append([ch, ch.get("children") or _EMPTY, 0, []])
+                continue
+            frames.pop()
+            n, kids = f[0], f[3]
+
+            eff = bool(n.get("visible_effective", True))
+            keep = keep_all or eff or len(kids) > 0 or contributes(n)
+            nn: Optional[Dict[str, Any]] = None
+            if keep:
+                # Grund kopia med strukturdelning: bara toppnivånycklar (children, z/order via
+                # _reindex_order) skrivs om; bounds/css/tw/icon m.fl. är läs-only efter bygget.
+                nn = n.copy()
+                nn["children"] = kids
+            if frames:
+                if nn is not None:
+                    frames[-1][3].append(nn)
+            else:
+                result = nn
+        return result
 
     root_in = ir_full["root"]
-    root_out = prune(root_in) or deepcopy(root_in)
-
-    # reindex
-    def _reindex(n: Dict[str, Any]):
-        for i,ch in enumerate(n.get("children") or []):
-            ch["z"] = i
-            by = int(round((ch.get("bounds",{}).get("y") or 0)))
-            bx = int(round((ch.get("bounds",{}).get("x") or 0)))
-            ch["order"] = i
-            ch["order_key"] = [by, bx, i]
-            _reindex(ch)
-    _reindex(root_out)
+    # Inget synligt alls → hela trädet behålls, som samma grunda kopia i stället för deepcopy
+    root_out = prune(root_in) or cast(Dict[str, Any], prune(root_in, keep_all=True))
+
+    _reindex_order(root_out)
 
     return {"meta": ir_full["meta"], "root": root_out}
 
@@ -919,125 +1199,127 @@ def filter_visible_ir(ir_full: Dict[str, Any]) -> Dict[str, Any]:
 
 def build_tailwind_map(ir_node: Dict[str, Any]) -> Dict[str, str]:
     tw_map: Dict[str, str] = {}
-    def rec(n: Dict[str, Any]):
+    stack = [ir_node]
+    pop = stack.pop
+    while stack:
+        n = pop()
         nid = n.get("id") or ""
         tw = (n.get("tw") or {}).get("classes", "")
         tw_map[nid] = tw
-        for ch in n.get("children", []):
-            rec(ch)
-    rec(ir_node)
+        stack.extend(reversed(n.get("children", _EMPTY)))  # preorder som den rekursiva varianten
     return tw_map
 
 def build_css_map(ir_node: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
     css_map: Dict[str, Dict[str, str]] = {}
-    def rec(n: Dict[str, Any]):
+    stack = [ir_node]
+    pop = stack.pop
+    while stack:
+        n = pop()
         nid = n.get("id") or ""
         raw = n.get("css", {}) or {}
-        css_map[nid] = {k: str(v) for k,v in raw.items()}
-        for ch in n.get("children", []):
-            rec(ch)
-    rec(ir_node)
+        css_map[nid] = {k: v if v.__class__ is str else str(v) for k,v in raw.items()}  # värden är redan str
+        stack.extend(reversed(n.get("children", _EMPTY)))
     return css_map
 
 def collect_image_refs(ir_node: Dict[str, Any]) -> List[str]:
-    out: List[str] = []
-    def rec(n: Dict[str, Any]):
-        if not bool(n.get("visible_effective", True)): return
-        for f in n.get("fills", []):
+    uniq: Dict[str, None] = {}  # ordnad dedupe direkt under traverseringen
+    stack = [ir_node]
+    pop = stack.pop
+    while stack:
+        n = pop()
+        if not bool(n.get("visible_effective", True)): continue
+        for f in n.get("fills", _EMPTY):
             if f.get("type")=="IMAGE" and f.get("imageRef"):
-                out.append(f.get("imageRef"))
-        for ch in n.get("children", []):
-            rec(ch)
-    rec(ir_node)
-    seen = set(); uniq: List[str] = []
-    for r in out:
-        if r not in seen:
-            seen.add(r); uniq.append(r)
-    return uniq
+                uniq[f["imageRef"]] = None
+        stack.extend(reversed(n.get("children", _EMPTY)))
+    return list(uniq)
+
+_MAX_ICON_LEAVES = 8  # fler leaves än så diskvalificerar en container-ikon
+
+def _gather_vector_leaves(n: Dict[str, Any], acc: List[Dict[str, Any]], max_depth: int = 5):
+    # Iterativ pre-order (barn pushas omvänt → samma ordning som rekursionen);
+    # avbryter så fort antalet leaves överskrider _MAX_ICON_LEAVES
+    stack: List[Tuple[Dict[str, Any], int]] = [(n, 0)]
+    pop, push = stack.pop, stack.append
+    while stack:
+        node, depth = pop()
+        if not node.get("visible_effective", True): continue
+        ch = node.get("children") or _EMPTY
+        if node.get("type") in _ICON_TYPES and not ch:
+            b = node.get("bounds") or {}
+            if isinstance(b, dict) and (b.get("w",0)*b.get("h",0)) >= 4:
+                acc.append(node)
+                if len(acc) > _MAX_ICON_LEAVES: return  # svaret är redan givet
+            continue
+        if depth < max_depth:
+            for c in reversed(ch):
+                push((c, depth + 1))
 
-def collect_icon_nodes(ir_node: Dict[str, Any]) -> List[Dict[str, Any]]:
+def _visit_icon(n: Dict[str, Any], uniq: Dict[str, Dict[str, Any]],
+                text_memo: Optional[Dict[int, bool]] = None) -> bool:
     """
-    Synliga ikon-noder i IR-trädet utan dubbletter.
-    - Leaf-ikon: node.icon.is_icon == True och visible_effective == True.
-    - Container-ikon: 1–8 synliga vektor-leaves, typiska mått och aspekt, ingen text.
+    Ikon-beslut för en synlig nod; registrerar träffen i uniq (första id vinner).
+    Returnerar True om delträdet är avgjort och inte ska genomsökas vidare.
     """
-    out: List[Dict[str, Any]] = []
-
-    def _visible(n: Dict[str, Any]) -> bool:
-        return bool(n.get("visible_effective", True))
-
-    def _gather_vector_leaves(n: Dict[str, Any], acc: List[Dict[str, Any]], depth: int = 0, max_depth: int = 5):
-        if depth > max_depth: return
-        if not _visible(n): return
-        t = n.get("type")
-        ch = n.get("children") or []
-        if t in _ICON_TYPES and not ch:
-            b = n.get("bounds") or {}
-            if isinstance(b, dict) and (b.get("w",0)*b.get("h",0)) >= 4:
-                acc.append(n); return
-        for c in ch: _gather_vector_leaves(c, acc, depth+1, max_depth)
-
-    def rec(n: Dict[str, Any]):
-        if not _visible(n): return
-        t = (n.get("type") or "")
-
-        ic = (n.get("icon") or {})
-        if ic.get("is_icon"):
-            b = ic.get("bounds") or n.get("bounds")
-            if isinstance(b, dict) and (b.get("w",0)*b.get("h",0)) >= 4:
-                out.append({
-                    "id": n.get("id"),
-                    "name": ic.get("name") or n.get("name"),
-                    "name_slug": ic.get("name_slug"),
-                    "bounds": b,
-                    "tintable": bool(ic.get("tintable")),
-                    "color": ic.get("dominant_color"),
-                    "alpha": ic.get("dominant_alpha", 1.0),
-                })
-            return
-
-        if t in _CONTAINERS:
-            leaves: List[Dict[str, Any]] = []
-            _gather_vector_leaves(n, leaves)
-            nb = (n.get("bounds") or {})
-            w = int(round(nb.get("w", 0) or 0)); h = int(round(nb.get("h", 0) or 0))
-            if (1 <= len(leaves) <= 8 and
-                ICON_MIN <= w <= ICON_MAX and ICON_MIN <= h <= ICON_MAX and
-                _aspect_ok(w, h) and not _has_text_desc(n) and (w*h) >= 4):
-                out.append({
-                    "id": n.get("id"),
+    t = (n.get("type") or "")
+
+    ic = (n.get("icon") or {})
+    if ic.get("is_icon"):
+        b = ic.get("bounds") or n.get("bounds")
+        nid = n.get("id")
+        if isinstance(b, dict) and (b.get("w",0)*b.get("h",0)) >= 4 and nid and nid not in uniq:
+            uniq[nid] = {
+                "id": nid,
+                "name": ic.get("name") or n.get("name"),
+                "name_slug": ic.get("name_slug"),
+                "bounds": b,
+                "tintable": bool(ic.get("tintable")),
+                "color": ic.get("dominant_color"),
+                "alpha": ic.get("dominant_alpha", 1.0),
+            }
+        return True
+
+    if t in _CONTAINERS:
+        nb = (n.get("bounds") or {})
+        w = int(round(nb.get("w", 0) or 0)); h = int(round(nb.get("h", 0) or 0))
+        if not (ICON_MIN <= w <= ICON_MAX and ICON_MIN <= h <= ICON_MAX and
+                _aspect_ok(w, h) and not _has_text_desc(n, text_memo) and (w*h) >= 4):
+            return False
+        # leaves samlas först när mått/text redan godkänts
+        leaves: List[Dict[str, Any]] = []
+        _gather_vector_leaves(n, leaves)
+        if 1 <= len(leaves) <= _MAX_ICON_LEAVES or (t == "INSTANCE" and len(leaves) == 0):
+            nid = n.get("id")
+            if nid and nid not in uniq:
+                uniq[nid] = {
+                    "id": nid,
                     "name": n.get("name"),
                     "name_slug": _slug(n.get("name") or "icon"),
                     "bounds": nb,
                     "tintable": True,
                     "color": None,
                     "alpha": 1.0,
-                })
-                return
-
-            if (t == "INSTANCE" and len(leaves) == 0 and
-                ICON_MIN <= w <= ICON_MAX and ICON_MIN <= h <= ICON_MAX and
-                _aspect_ok(w, h) and not _has_text_desc(n) and (w*h) >= 4):
-                out.append({
-                    "id": n.get("id"),
-                    "name": n.get("name"),
-                    "name_slug": _slug(n.get("name") or "icon"),
-                    "bounds": nb,
-                    "tintable": True,
-                    "color": None,
-                    "alpha": 1.0,
-                })
-                return
-
-        for ch in n.get("children") or []:
-            rec(ch)
+                }
+            return True
 
-    rec(ir_node)
+    return False
 
-    uniq: Dict[str, Dict[str, Any]] = {}
-    for x in out:
-        if x["id"] and x["id"] not in uniq:
-            uniq[x["id"]] = x
+def collect_icon_nodes(ir_node: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Synliga ikon-noder i IR-trädet utan dubbletter.
+    - Leaf-ikon: node.icon.is_icon == True och visible_effective == True.
+    - Container-ikon: 1–8 synliga vektor-leaves, typiska mått och aspekt, ingen text.
+    """
+    uniq: Dict[str, Dict[str, Any]] = {}  # id → ikon; första träffen vinner, tomma id hoppas över
+    text_memo: Dict[int, bool] = {}       # _has_text_desc per nod, giltig under denna insamling
+
+    stack = [ir_node]
+    pop = stack.pop
+    while stack:
+        n = pop()
+        if not n.get("visible_effective", True): continue
+        if _visit_icon(n, uniq, text_memo): continue
+        stack.extend(reversed(n.get("children") or _EMPTY))
     return list(uniq.values())
 
 # ────────────────────────────────────────────────────────────────────────────
@@ -1045,16 +1327,28 @@ def collect_icon_nodes(ir_node: Dict[str, Any]) -> List[Dict[str, Any]]:
 # ────────────────────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":  # pragma: no cover
-    import json as _json, sys
+    import json as _json
+    _loads: Callable[[bytes], Any]
+    _dumps: Callable[[Any], str]
+    try:
+        # Valfritt: orjson parsar/serialiserar stora exporter betydligt snabbare. Utdata kan
+        # skilja sig från stdlib-json: flyttal formateras annorlunda (1e-05 → 1e-5) och NaN blir null.
+        import orjson as _orjson  # type: ignore[import-not-found]
+        _loads = _orjson.loads
+        _dumps = lambda o: _orjson.dumps(o, option=_orjson.OPT_INDENT_2).decode("utf-8")
+    except ImportError:
+        _loads = lambda b: _json.loads(b.decode("utf-8"))
+        _dumps = lambda o: _json.dumps(o, ensure_ascii=False, indent=2)
     if len(sys.argv) < 3:
         print("Använd: python -m backend.tasks.figma_ir <nodes.json> <node_id>")
         sys.exit(1)
-    with open(sys.argv[1], "r", encoding="utf-8") as f:
-        payload = _json.load(f)
+    with open(sys.argv[1], "rb") as f:
+        payload = _loads(f.read())
     nid = sys.argv[2]
-    ir_full = figma_to_ir(payload, nid)
+    # Dolda delträd rensas ändå av filter_visible_ir → bygg dem inte alls
+    ir_full = figma_to_ir(payload, nid, skip_hidden=True)
     ir = filter_visible_ir(ir_full)
-    print(_json.dumps(ir, ensure_ascii=False, indent=2))
+    print(_dumps(ir))
 
 __all__ = [
     "figma_to_ir",